@@ -0,0 +1,155 @@
+# chat_archive.py
+"""
+Archive chat rooms to local disk before they are deleted (kept for abuse reports).
+
+Layout under CHAT_ARCHIVE_DIR (default ./chat_archive):
+    segment-00000.jsonl.gz   append-only; each archived room is one gzip member
+    index.jsonl              one line per room: segment, byte offset, length, count
+
+Messages are paged out of chats/<room>/messages ordered by key, ARCHIVE_PAGE_SIZE
+at a time, and compressed straight to the segment file, so memory stays flat
+however large the room is. A segment is closed once it grows past
+ARCHIVE_SEGMENT_BYTES. Because every room is its own gzip member, a room can be
+read back by seeking to its offset; the segment as a whole is still a valid
+.gz file that `zcat` can read.
+"""
+import json
+import os
+import threading
+import zlib
+from datetime import datetime, timezone
+
+from firebase_admin import db
+
+ARCHIVE_DIR = os.getenv("CHAT_ARCHIVE_DIR", "chat_archive")
+ARCHIVE_PAGE_SIZE = int(os.getenv("ARCHIVE_PAGE_SIZE", "500"))
+ARCHIVE_SEGMENT_BYTES = int(os.getenv("ARCHIVE_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+
+_INDEX_FILE = "index.jsonl"
+_lock = threading.Lock()
+_index = None  # room id -> index entry (loaded lazily)
+
+
+def _path(name: str) -> str:
+    return os.path.join(ARCHIVE_DIR, name)
+
+
+def _segment_name(n: int) -> str:
+    return f"segment-{n:05d}.jsonl.gz"
+
+
+def _load_index() -> dict:
+    global _index
+    if _index is None:
+        _index = {}
+        try:
+            with open(_path(_INDEX_FILE), encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        _index[entry["room"]] = entry
+        except FileNotFoundError:
+            pass
+    return _index
+
+
+def _current_segment() -> str:
+    """Newest segment file, or the next one if it is full."""
+    names = sorted(n for n in os.listdir(ARCHIVE_DIR)
+                   if n.startswith("segment-") and n.endswith(".jsonl.gz"))
+    if not names:
+        return _segment_name(0)
+    last = names[-1]
+    if os.path.getsize(_path(last)) >= ARCHIVE_SEGMENT_BYTES:
+        return _segment_name(int(last[len("segment-"):].split(".")[0]) + 1)
+    return last
+
+
+def iter_room_messages(room_id: str, page_size: int = None):
+    """Yield (key, message) from chats/<room>/messages, one limited query per page."""
+    page_size = page_size or ARCHIVE_PAGE_SIZE
+    ref = db.reference(f"chats/{room_id}/messages")
+    last = None
+    while True:
+        q = ref.order_by_key()
+        if last is None:
+            page = q.limit_to_first(page_size).get() or {}
+        else:
+            # start_at is inclusive, so ask for one extra and drop the cursor row
+            page = q.start_at(last).limit_to_first(page_size + 1).get() or {}
+        items = [(k, v) for k, v in page.items() if k != last]
+        for key, msg in items:
+            yield key, msg
+        if not items or len(items) < page_size:
+            return
+        last = items[-1][0]
+
+
+def archive_room(room_id: str, meta: dict = None) -> dict:
+    """
+    Stream one room's messages into the current segment and record it in the index.
+    `meta` (users, created_at, expires_at, ...) is stored as the first line.
+    Re-archiving a room appends a new copy; the index points at the latest one.
+    """
+    with _lock:
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        segment = _current_segment()
+        count = 0
+        with open(_path(segment), "ab") as f:
+            offset = f.tell()
+            try:
+                z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip member
+                header = {"room": room_id, "meta": meta or {},
+                          "archived_at": datetime.now(timezone.utc).isoformat()}
+                f.write(z.compress((json.dumps(header, ensure_ascii=False) + "\n").encode("utf-8")))
+                for key, msg in iter_room_messages(room_id):
+                    # clients write messages directly, so they aren't always objects
+                    line = {"key": key, **msg} if isinstance(msg, dict) else {"key": key, "value": msg}
+                    f.write(z.compress((json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8")))
+                    count += 1
+                f.write(z.flush())
+                f.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                f.truncate(offset)  # drop the half-written member so the segment stays a valid .gz
+                raise
+            length = f.tell() - offset
+
+        entry = {"room": room_id, "segment": segment, "offset": offset,
+                 "length": length, "messages": count,
+                 "archived_at": header["archived_at"]}
+        with open(_path(_INDEX_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        _load_index()[room_id] = entry
+        return entry
+
+
+def lookup(room_id: str):
+    """Index entry of an archived room, or None."""
+    with _lock:
+        return _load_index().get(room_id)
+
+
+def iter_archived_messages(room_id: str, chunk_size: int = 64 * 1024):
+    """Yield the archived lines of a room as dicts (header first), decompressing in chunks."""
+    entry = lookup(room_id)
+    if entry is None:
+        return
+    z = zlib.decompressobj(31)
+    buf = b""
+    with open(_path(entry["segment"]), "rb") as f:
+        f.seek(entry["offset"])
+        remaining = entry["length"]
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            buf += z.decompress(chunk)
+            *lines, buf = buf.split(b"\n")
+            for line in lines:
+                if line:
+                    yield json.loads(line)
+    buf += z.flush()
+    if buf.strip():
+        yield json.loads(buf)
@@ -5,10 +5,13 @@ import uuid
 import threading
 import time
 from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
 
 import firebase_admin
 from firebase_admin import credentials, db
 
+import chat_archive
+
 # ---- init firebase admin ----
 if not firebase_admin._apps:
     svc_json = json.loads(os.environ["FIREBASE_SERVICE_ACCOUNT_JSON"])
@@ -23,61 +26,114 @@ def _now_utc():
 def _iso(dt):
     return dt.astimezone(timezone.utc).isoformat()
 
-def create_chat_room(user_a_id: int, user_b_id: int) -> str:
-    """
-    Creates a chat room in RTDB that expires in 24 hours.
-    Returns a full URL to /chat?room=ROOM_ID with &me=<id> prefilled.
-    """
-    room_id = uuid.uuid4().hex[:16]
-    ref = db.reference(f"chats/{room_id}")
-    created = _now_utc()
-    expires = created + timedelta(hours=24)
-
-    ref.set({
-        "users": { str(user_a_id): True, str(user_b_id): True },
-        "created_at": _iso(created),
-        "expires_at": _iso(expires),
-        "messages": {}
-    })
-
+def _chat_link(room_id: str, me, my_name: str, peer, peer_name: str) -> str:
     base = os.getenv("WEB_CHAT_BASE", "http://localhost:8000")
     # each user gets their own link with ?me=<id> so messages show their name/id
-from urllib.parse import quote
+    return (f"{base}/chat?room={room_id}&me={me}&myName={quote(my_name)}"
+            f"&peer={peer}&peerName={quote(peer_name)}")
 
 def create_chat_room(user_a_id: int, user_b_id: int, name_a: str = "Me", name_b: str = "Partner"):
+    """
+    Creates a chat room in RTDB that expires in 24 hours, and indexes it under
+    user_rooms/<user>/<room> for both users in the same atomic multi-path update.
+    Returns (link_a, link_b, room_id).
+    """
     room_id = uuid.uuid4().hex[:16]
-    ref = db.reference(f"chats/{room_id}")
     created = _now_utc()
-    expires = created + timedelta(hours=24)
+    expires = _iso(created + timedelta(hours=24))
 
-    ref.set({
-        "users": { str(user_a_id): True, str(user_b_id): True },
-        "created_at": _iso(created),
-        "expires_at": _iso(expires),
-        "messages": {}
+    db.reference().update({
+        f"chats/{room_id}": {
+            "users": { str(user_a_id): True, str(user_b_id): True },
+            "created_at": _iso(created),
+            "expires_at": expires,
+        },
+        f"user_rooms/{user_a_id}/{room_id}": {
+            "peer": str(user_b_id), "my_name": name_a, "peer_name": name_b, "expires_at": expires,
+        },
+        f"user_rooms/{user_b_id}/{room_id}": {
+            "peer": str(user_a_id), "my_name": name_b, "peer_name": name_a, "expires_at": expires,
+        },
     })
 
-    base = os.getenv("WEB_CHAT_BASE", "http://localhost:8000")
-    link_a = f"{base}/chat?room={room_id}&me={user_a_id}&myName={quote(name_a)}&peer={user_b_id}&peerName={quote(name_b)}"
-    link_b = f"{base}/chat?room={room_id}&me={user_b_id}&myName={quote(name_b)}&peer={user_a_id}&peerName={quote(name_a)}"
+    link_a = _chat_link(room_id, user_a_id, name_a, user_b_id, name_b)
+    link_b = _chat_link(room_id, user_b_id, name_b, user_a_id, name_a)
     return link_a, link_b, room_id
 
-def delete_chat_room(room_id: str):
-    db.reference(f"chats/{room_id}").delete()
-
-def cleanup_expired_once():
-    root = db.reference("chats").get() or {}
+def list_user_rooms(user_id: int) -> list:
+    """
+    Live rooms of a user with fresh links, newest expiry first; one read of
+    user_rooms/<user> (no scan of chats). Returns dicts with room_id, link,
+    peer_name and expires_at.
+    """
+    rooms = db.reference(f"user_rooms/{user_id}").get() or {}
     now = _now_utc()
-    to_delete = []
-    for room_id, data in root.items():
+    live = []
+    for room_id, r in rooms.items():
         try:
-            exp = datetime.fromisoformat(data.get("expires_at"))
+            exp = datetime.fromisoformat(r.get("expires_at"))
         except Exception:
             continue
         if exp < now:
-            to_delete.append(room_id)
-    for rid in to_delete:
-        db.reference(f"chats/{rid}").delete()
+            continue  # cleanup_expired_once removes it
+        live.append({
+            "room_id": room_id,
+            "link": _chat_link(room_id, user_id, r.get("my_name") or "Me",
+                               r.get("peer", ""), r.get("peer_name") or "Partner"),
+            "peer_name": r.get("peer_name") or "Partner",
+            "expires_at": exp,
+        })
+    live.sort(key=lambda r: r["expires_at"], reverse=True)
+    return live
+
+def _room_meta(room_id: str) -> dict:
+    """Small fields of a room, read without pulling its messages."""
+    ref = db.reference(f"chats/{room_id}")
+    return {k: ref.child(k).get() for k in ("users", "created_at", "expires_at")}
+
+def delete_chat_room(room_id: str):
+    # archive first; if that fails the room is kept
+    meta = _room_meta(room_id)
+    chat_archive.archive_room(room_id, meta)
+    # drop the room and its user_rooms entries together
+    updates = {f"chats/{room_id}": None}
+    for uid in (meta.get("users") or {}):
+        updates[f"user_rooms/{uid}/{room_id}"] = None
+    db.reference().update(updates)
+
+def cleanup_expired_once(limit: int = 100):
+    """
+    Delete rooms past expires_at. Ordered queries return only expired rooms,
+    limit at a time, so the cost doesn't grow with the number of live rooms.
+    Rooms that fail to archive are kept and paged past, so they can't block
+    the rest; they are retried next round. Needs the rule
+        "chats": { ".indexOn": ["expires_at"] }
+    in the database rules (RTDB refuses unindexed orderBy queries).
+    """
+    cutoff = _iso(_now_utc())
+    failed = set()
+    start = None
+    while True:
+        q = db.reference("chats").order_by_child("expires_at")
+        if start is not None:
+            q = q.start_at(start)  # inclusive; rooms already tried are skipped below
+        page = q.end_at(cutoff).limit_to_first(limit).get() or {}
+        deleted = 0
+        for rid in page:
+            if rid in failed:
+                continue
+            try:
+                delete_chat_room(rid)
+                deleted += 1
+            except Exception:
+                failed.add(rid)  # archive failed -> keep the room
+        if len(page) < limit:
+            return
+        last = list(page.values())[-1]
+        nxt = last.get("expires_at") if isinstance(last, dict) else None
+        if nxt is None or (nxt == start and not deleted):
+            return  # no progress possible this round
+        start = nxt
 
 def _cleanup_loop():
     while True:
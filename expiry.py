@@ -0,0 +1,106 @@
+# expiry.py
+"""
+TTL for waiting-pool entries.
+
+Every entry gets POOL_TTL_HOURS from its Timestamp. POOL_REMIND_HOURS before
+that the user is asked "still looking?" (set to 0 to skip the reminder); a
+tap on "Yes, keep me" refreshes the Timestamp. Entries past the TTL are
+removed from the in-memory index and deleted from the sheet in batches.
+
+The sweeper only walks the index's time buckets older than its cutoffs, so the
+cost of a sweep depends on how many entries are due, not on the pool size.
+"""
+import asyncio
+import logging
+import os
+import time
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import sheet_manager
+
+logger = logging.getLogger(__name__)
+
+POOL_TTL_HOURS = float(os.getenv("POOL_TTL_HOURS", "720"))      # 30 days
+POOL_REMIND_HOURS = float(os.getenv("POOL_REMIND_HOURS", "48"))
+SWEEP_INTERVAL = int(os.getenv("POOL_SWEEP_INTERVAL", "600"))   # seconds
+DELETE_BATCH = int(os.getenv("POOL_DELETE_BATCH", "100"))
+
+KEEP_CALLBACK = "keep"
+
+_reminded = set()  # (user id, timestamp) of entries we already asked about
+
+
+def _key(row: dict):
+    return (str(row.get("User ID", "")), str(row.get("Timestamp", "")))
+
+
+def _keep_markup():
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("✅ Yes, keep me", callback_data=KEEP_CALLBACK)]
+    ])
+
+
+async def _remind(bot, rows: list):
+    for row in rows:
+        k = _key(row)
+        if k in _reminded:
+            continue
+        _reminded.add(k)
+        try:
+            await bot.send_message(
+                chat_id=int(row.get("User ID")),
+                text=(f"⏳ Still looking to swap "
+                      f"{row.get('Skill') or '—'} ⇄ {row.get('Want') or '—'}?\n"
+                      f"Your request will be removed in about {POOL_REMIND_HOURS:g}h."),
+                reply_markup=_keep_markup(),
+            )
+        except Exception:
+            logger.exception("Could not send reminder to %s", k[0])
+
+
+async def sweep_once(bot, pool, now: float = None) -> int:
+    """Expire entries past the TTL, then send due reminders. Returns number of expired entries."""
+    now = time.time() if now is None else now
+    ttl = POOL_TTL_HOURS * 3600
+
+    expired = pool.pop_older_than(now - ttl)
+    for i in range(0, len(expired), DELETE_BATCH):
+        batch = expired[i:i + DELETE_BATCH]
+        try:
+            await asyncio.to_thread(sheet_manager.delete_rows_batch, batch)
+        except Exception:
+            logger.exception("Failed deleting %d expired rows", len(batch))
+    for row in expired:
+        _reminded.discard(_key(row))
+    if expired:
+        logger.info("Expired %d waiting entries", len(expired))
+
+    if bot is not None and 0 < POOL_REMIND_HOURS < POOL_TTL_HOURS:
+        due = list(pool.iter_older_than(now - ttl + POOL_REMIND_HOURS * 3600))
+        await _remind(bot, due)
+    return len(expired)
+
+
+async def refresh(pool, user_id, ts: str) -> int:
+    """Re-confirm all waiting entries of a user: new Timestamp in the sheet and the index."""
+    rows = pool.user_rows(user_id)
+    if not rows:
+        return 0
+    await asyncio.to_thread(sheet_manager.touch_rows, rows, ts)
+    kept = 0
+    for row in rows:
+        _reminded.discard(_key(row))
+        if pool.remove(row):  # may have been matched while the sheet was updated
+            pool.add({**row.to_row(), "Timestamp": ts})
+            kept += 1
+    return kept
+
+
+async def sweep_loop(bot, get_pool):
+    while True:
+        try:
+            await sweep_once(bot, get_pool())
+        except Exception:
+            logger.exception("Pool sweep failed")
+        await asyncio.sleep(SWEEP_INTERVAL)
@@ -0,0 +1,351 @@
+# loadtest.py
+"""
+End-to-end load generator for the signup conversation in main_bot.
+
+Drives the real Application built by main_bot.build_application() with
+synthetic Updates for the full flow:
+    /start -> name -> learn/teach -> answer -> optional (None button or text)
+
+Telegram, Google Sheets and Firebase are replaced by in-process fakes:
+  - RecordingBot records every send/edit instead of calling Telegram
+  - fake `sheet_manager` / `chat_manager` modules keep the pool in memory and
+    sleep for a configurable latency on each call (blocking, like gspread and
+    firebase_admin do in production)
+
+Every simulated user waits for the bot's reply before sending the next step,
+so `concurrency` is the number of users in the middle of a signup at once.
+For each concurrency level we report throughput (signups/s) and p50/p95/p99
+latency from /start to the user's match / no-match notification.
+
+Usage:
+    python loadtest.py --concurrency 1,5,20,50 --signups 200 \
+        --sheet-latency-ms 150 --firebase-latency-ms 80
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:LOADTEST")
+
+import matcher
+
+# ---------------- fake backends ----------------
+class FakeBackends:
+    """Latency knobs + in-memory state shared by the fake modules."""
+    def __init__(self):
+        self.sheet_latency = 0.0
+        self.firebase_latency = 0.0
+        self.rows = []
+        self.rooms = 0
+        self.calls = {}
+
+    def reset(self, sheet_latency: float, firebase_latency: float):
+        self.sheet_latency = sheet_latency
+        self.firebase_latency = firebase_latency
+        self.rows = []
+        self.rooms = 0
+        self.calls = {}
+
+    def _hit(self, name: str, latency: float):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if latency:
+            time.sleep(latency)
+
+backends = FakeBackends()
+
+
+def _fake_sheet_manager():
+    mod = types.ModuleType("sheet_manager")
+
+    def save_user_row(user_id, name, skill, want):
+        # timestamp taken before the request, like the real save_user_row
+        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        backends._hit("sheet.save_user_row", backends.sheet_latency)
+        backends.rows.append({
+            "User ID": str(user_id),
+            "Name": name or "",
+            "Skill": skill or "",
+            "Want": want or "",
+            "Timestamp": ts,
+        })
+        return ts
+
+    def get_all_records():
+        backends._hit("sheet.get_all_records", backends.sheet_latency)
+        return [dict(r) for r in backends.rows]
+
+    def delete_matched_pair(new_row, match=None):
+        backends._hit("sheet.delete_matched_pair", backends.sheet_latency)
+        match = match or matcher.find_one_match(new_row, backends.rows)
+        if not match:
+            return False
+        drop = {str(new_row.get("User ID")), str(match.get("User ID"))}
+        backends.rows = [r for r in backends.rows if r["User ID"] not in drop]
+        return True
+
+    def delete_rows_batch(rows):
+        backends._hit("sheet.delete_rows_batch", backends.sheet_latency)
+        drop = {(str(r.get("User ID")), r.get("Timestamp")) for r in rows}
+        before = len(backends.rows)
+        backends.rows = [r for r in backends.rows
+                         if (r["User ID"], r["Timestamp"]) not in drop]
+        return before - len(backends.rows)
+
+    def touch_rows(rows, ts):
+        backends._hit("sheet.touch_rows", backends.sheet_latency)
+        keys = {(str(r.get("User ID")), r.get("Timestamp")) for r in rows}
+        hits = [r for r in backends.rows if (r["User ID"], r["Timestamp"]) in keys]
+        for r in hits:
+            r["Timestamp"] = ts
+        return len(hits)
+
+    mod.save_user_row = save_user_row
+    mod.get_all_records = get_all_records
+    mod.delete_matched_pair = delete_matched_pair
+    mod.delete_rows_batch = delete_rows_batch
+    mod.touch_rows = touch_rows
+    return mod
+
+
+def _fake_chat_manager():
+    mod = types.ModuleType("chat_manager")
+
+    def create_chat_room(user_a_id, user_b_id, name_a="Me", name_b="Partner"):
+        backends._hit("firebase.create_chat_room", backends.firebase_latency)
+        backends.rooms += 1
+        room_id = f"room{backends.rooms:06d}"
+        base = "http://loadtest.invalid"
+        return (f"{base}/chat?room={room_id}&me={user_a_id}",
+                f"{base}/chat?room={room_id}&me={user_b_id}",
+                room_id)
+
+    def list_user_rooms(user_id):
+        backends._hit("firebase.list_user_rooms", backends.firebase_latency)
+        return []
+
+    mod.create_chat_room = create_chat_room
+    mod.list_user_rooms = list_user_rooms
+    return mod
+
+
+# the real modules connect to Google / Firebase at import time
+sys.modules["sheet_manager"] = _fake_sheet_manager()
+sys.modules["chat_manager"] = _fake_chat_manager()
+
+from telegram import Update, User  # noqa: E402
+from telegram.ext import ExtBot  # noqa: E402
+
+import main_bot  # noqa: E402
+import pool_snapshot  # noqa: E402
+import ratelimit  # noqa: E402
+
+BOT_ID = 999000
+NOTIFY_PREFIXES = ("🎉 Match found", "No match found")
+
+
+# ---------------- fake bot ----------------
+class RecordingBot(ExtBot):
+    """ExtBot that records outgoing calls and wakes up the waiting simulated user."""
+
+    def __init__(self, bot_latency: float = 0.0):
+        super().__init__(token=os.environ["TELEGRAM_BOT_TOKEN"])
+        self._bot_latency = bot_latency
+        self._inboxes = {}
+
+    def inbox(self, chat_id: int) -> asyncio.Queue:
+        q = self._inboxes.get(chat_id)
+        if q is None:
+            q = self._inboxes[chat_id] = asyncio.Queue()
+        return q
+
+    async def _deliver(self, chat_id, text):
+        if self._bot_latency:
+            await asyncio.sleep(self._bot_latency)
+        self.inbox(int(chat_id)).put_nowait((time.perf_counter(), text))
+
+    async def get_me(self, *args, **kwargs):
+        self._bot_user = User(id=BOT_ID, is_bot=True, first_name="LoadTest",
+                              username="loadtest_bot")
+        return self._bot_user
+
+    async def send_message(self, chat_id, text, *args, **kwargs):
+        await self._deliver(chat_id, text)
+        return True
+
+    async def edit_message_text(self, text, chat_id=None, *args, **kwargs):
+        await self._deliver(chat_id, text)
+        return True
+
+    async def answer_callback_query(self, *args, **kwargs):
+        return True
+
+
+# ---------------- synthetic updates ----------------
+_update_ids = itertools.count(1)
+
+
+def _user(uid: int) -> dict:
+    return {"id": uid, "is_bot": False, "first_name": f"User{uid}"}
+
+
+def _message_update(uid: int, text: str) -> dict:
+    msg = {
+        "message_id": next(_update_ids),
+        "date": int(time.time()),
+        "chat": {"id": uid, "type": "private"},
+        "from": _user(uid),
+        "text": text,
+    }
+    if text.startswith("/"):
+        msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": next(_update_ids), "message": msg}
+
+
+def _callback_update(uid: int, data: str) -> dict:
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)),
+            "from": _user(uid),
+            "chat_instance": str(uid),
+            "data": data,
+            "message": {
+                "message_id": next(_update_ids),
+                "date": int(time.time()),
+                "chat": {"id": uid, "type": "private"},
+                "from": {"id": BOT_ID, "is_bot": True, "first_name": "LoadTest"},
+                "text": "Choose an option:",
+            },
+        },
+    }
+
+
+def _script(uid: int, n: int) -> list:
+    """
+    Conversation steps for the n-th signup. Consecutive signups form a pair that
+    matches: even pairs use the cross rule (None button), odd pairs the mutual
+    swap rule (typed optional answer).
+    """
+    pair, second = divmod(n, 2)
+    a, b = f"skill{pair}a", f"skill{pair}b"
+    choice = "teach" if second else "learn"
+    steps = [_message_update(uid, "/start"),
+             _message_update(uid, f"User{uid}"),
+             _callback_update(uid, choice)]
+    if pair % 2 == 0:
+        steps += [_message_update(uid, a), _callback_update(uid, "none")]
+    else:
+        steps += [_message_update(uid, a), _message_update(uid, b)]
+    return steps
+
+
+# ---------------- driver ----------------
+async def _one_signup(app, bot: RecordingBot, uid: int, n: int, timeout: float) -> float:
+    inbox = bot.inbox(uid)
+    started = time.perf_counter()
+    steps = _script(uid, n)
+    for i, raw in enumerate(steps):
+        await app.update_queue.put(Update.de_json(raw, bot))
+        last = i == len(steps) - 1
+        while True:
+            at, text = await asyncio.wait_for(inbox.get(), timeout)
+            if not last or text.startswith(NOTIFY_PREFIXES):
+                break
+    return at - started
+
+
+def _pct(sorted_vals: list, p: float) -> float:
+    if not sorted_vals:
+        return float("nan")
+    k = min(len(sorted_vals) - 1, max(0, int(round(p / 100 * len(sorted_vals))) - 1))
+    return sorted_vals[k]
+
+
+async def run_level(concurrency: int, signups: int, args) -> dict:
+    backends.reset(args.sheet_latency_ms / 1000, args.firebase_latency_ms / 1000)
+    main_bot._pool = None  # reload the match index from the (empty) fake sheet
+    if not args.flood_guard:  # synthetic users would trip the global rate limit
+        main_bot._flood = ratelimit.FloodGuard(user_per_min=float("inf"), user_burst=float("inf"),
+                                               global_per_sec=float("inf"), global_burst=float("inf"))
+    else:
+        main_bot._flood = ratelimit.FloodGuard()
+    state_dir = tempfile.TemporaryDirectory(prefix="loadtest-pool-")
+    pool_snapshot.POOL_STATE_DIR = state_dir.name
+    bot = RecordingBot(bot_latency=args.bot_latency_ms / 1000)
+    app = main_bot.build_application(bot=bot)
+
+    latencies, errors = [], 0
+    counter = itertools.count()
+    uid_base = 10_000_000 * concurrency
+
+    async def worker():
+        nonlocal errors
+        while True:
+            n = next(counter)
+            if n >= signups:
+                return
+            try:
+                latencies.append(await _one_signup(app, bot, uid_base + n, n, args.timeout))
+            except asyncio.TimeoutError:
+                errors += 1
+
+    with state_dir:
+        async with app:
+            await app.start()
+            t0 = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - t0
+            await app.stop()
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "signups": len(latencies),
+        "errors": errors,
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": _pct(latencies, 50),
+        "p95": _pct(latencies, 95),
+        "p99": _pct(latencies, 99),
+        "rooms": backends.rooms,
+        "calls": dict(backends.calls),
+    }
+
+
+def _parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Load test the SkillSwapper signup conversation.")
+    p.add_argument("--concurrency", default="1,5,20,50",
+                   help="comma separated list of concurrent users per level")
+    p.add_argument("--signups", type=int, default=200, help="signups per level")
+    p.add_argument("--sheet-latency-ms", type=float, default=150.0)
+    p.add_argument("--firebase-latency-ms", type=float, default=80.0)
+    p.add_argument("--bot-latency-ms", type=float, default=0.0,
+                   help="latency of each Telegram API call")
+    p.add_argument("--flood-guard", action="store_true",
+                   help="keep main_bot's per-user/global rate limits on (off by default)")
+    p.add_argument("--timeout", type=float, default=120.0,
+                   help="seconds to wait for a single bot reply")
+    return p.parse_args(argv)
+
+
+async def _main(args):
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    print(f"{'conc':>5} {'signups':>8} {'err':>4} {'signups/s':>10} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for c in levels:
+        r = await run_level(c, args.signups, args)
+        print(f"{r['concurrency']:>5} {r['signups']:>8} {r['errors']:>4} "
+              f"{r['throughput']:>10.2f} {r['p50'] * 1000:>9.1f} "
+              f"{r['p95'] * 1000:>9.1f} {r['p99'] * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.INFO)
+    asyncio.run(_main(_parse_args()))
@@ -1,12 +1,22 @@
 # main_bot.py
 import os  # NEW
+import asyncio
 import logging
-from datetime import datetime
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from datetime import datetime, timezone
+from telegram import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+    Update,
+)
 from telegram.ext import (
     ApplicationBuilder,
+    ApplicationHandlerStop,
     CommandHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
+    TypeHandler,
     MessageHandler,
     ConversationHandler,
     ContextTypes,
@@ -15,13 +25,19 @@ from telegram.ext import (
 
 import sheet_manager
 import matcher
-from chat_manager import create_chat_room  # NEW
+import expiry
+import skill_index
+import pool_snapshot
+import pool_stats
+import ratelimit
+from chat_manager import create_chat_room, list_user_rooms  # NEW
 from referral import send_referral_reminder
 
 import telegram
 print("Using python-telegram-bot version:", telegram.__version__)
 # --------------- CONFIG ----------------
 BOT_TOKEN = os.environ["TELEGRAM_BOT_TOKEN"]  # CHANGED: read from secret
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x}
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -35,12 +51,52 @@ def _inline_choice_markup():
         [InlineKeyboardButton("📗 I want to Teach", callback_data="teach")]
     ])
 
+def _browse_skills_button():
+    # opens "@bot <typing>" in this chat; answered by inline_skills
+    return InlineKeyboardButton("🔎 Browse popular skills", switch_inline_query_current_chat="")
+
+def _inline_browse_markup():
+    return InlineKeyboardMarkup([[_browse_skills_button()]])
+
 def _inline_none_back_markup():
     return InlineKeyboardMarkup([
         [InlineKeyboardButton("None", callback_data="none")],
-        [InlineKeyboardButton("Back", callback_data="back")]
+        [InlineKeyboardButton("Back", callback_data="back")],
+        [_browse_skills_button()]
     ])
 
+# --------------- flood control ----------------
+_flood = ratelimit.FloodGuard()
+# inline queries come per keystroke: own bucket, so typing doesn't eat the signup's budget
+_inline_flood = ratelimit.FloodGuard(user_per_min=ratelimit.RATE_INLINE_PER_MIN,
+                                     user_burst=ratelimit.RATE_INLINE_BURST)
+
+async def flood_guard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Runs before every other handler (group -1); drops updates over the rate limits."""
+    user = update.effective_user
+    if user is None:
+        return
+    if update.inline_query:
+        if _inline_flood.check(user.id):
+            raise ApplicationHandlerStop  # nothing to reply to; the next keystroke retries
+        return
+    msg_text = (update.message.text or "") if update.message else ""
+    cost = ratelimit.START_COST if msg_text.startswith("/start") else 1
+    wait = _flood.check(user.id, cost)
+    if not wait:
+        return
+    # only spend the one cooldown reply on updates we can actually answer
+    if (update.callback_query or update.message) and _flood.should_warn(user.id, wait):
+        text = f"⏳ Easy there! Please wait about {max(1, round(wait))}s and try again."
+        try:
+            if update.callback_query:
+                await update.callback_query.answer(text)
+            else:
+                await update.message.reply_text(text)
+        except Exception:
+            logger.exception("Could not send cooldown reply.")
+    raise ApplicationHandlerStop
+
 # --------------- handlers ----------------
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("👋 Welcome to SkillSwapper!\n\nWhat's your name?")
@@ -63,9 +119,11 @@ async def choice_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['choice'] = choice
 
     if choice == "learn":
-        await query.edit_message_text("What skill do you want to *learn*? (type below)")
+        await query.edit_message_text("What skill do you want to *learn*? (type below)",
+                                      reply_markup=_inline_browse_markup())
     else:
-        await query.edit_message_text("What skill do you want to *teach*? (type below)")
+        await query.edit_message_text("What skill do you want to *teach*? (type below)",
+                                      reply_markup=_inline_browse_markup())
 
     return STATE_MAIN_ANSWER
 
@@ -128,21 +186,167 @@ async def back_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.message.reply_text("Choose an option:", reply_markup=_inline_choice_markup())
     return STATE_CHOICE
 
+async def keep_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """'Yes, keep me' on the still-looking reminder."""
+    query = update.callback_query
+    await query.answer()
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        kept = await expiry.refresh(await _pool_ready(), query.from_user.id, ts)
+    except Exception:
+        logger.exception("Failed to refresh waiting entry")
+        kept = 0
+    text = ("👍 Great — you stay in the queue." if kept
+            else "Your request has already expired. Send /start to sign up again.")
+    try:
+        await query.edit_message_text(text)
+    except Exception:
+        await query.message.reply_text(text)
+
+async def inline_skills(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Inline query: suggest popular skills from the waiting pool matching what's typed."""
+    query = update.inline_query
+    await _pool_ready()  # make sure the skill index is loaded
+    results = [
+        InlineQueryResultArticle(
+            id=str(i),
+            title=skill,
+            description=f"{count} in the pool",
+            input_message_content=InputTextMessageContent(skill),
+        )
+        for i, (skill, count) in enumerate(_skills.suggest(query.query))
+    ]
+    await query.answer(results, cache_time=30)
+
+async def chats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/chats: the user's live chat rooms with fresh links."""
+    try:
+        rooms = await asyncio.to_thread(list_user_rooms, update.effective_user.id)
+    except Exception:
+        logger.exception("Failed to list chat rooms")
+        await update.message.reply_text("Chats are temporarily unavailable. Please try again later.")
+        return
+    if not rooms:
+        await update.message.reply_text("You have no active chats. Send /start to find a match.")
+        return
+    entries = []
+    for r in rooms:
+        left = max(0, int((r["expires_at"] - datetime.now(timezone.utc)).total_seconds() // 3600))
+        entries.append(f"👤 {r['peer_name']} — expires in ~{left}h\n{r['link']}")
+    await update.message.reply_text("💬 Your active chats:\n\n" + "\n\n".join(entries))
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/stats [n] (admins only): skills with the biggest supply/demand gap."""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    try:
+        n = max(1, min(50, int(context.args[0]))) if context.args else 10
+    except ValueError:
+        n = 10
+    await _pool_ready()
+    await update.message.reply_text(pool_stats.format_report(_stats, n))
+
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Operation cancelled.")
     return ConversationHandler.END
 
+# ---------------- waiting pool ----------------
+_pool = None
+_skills = skill_index.SkillIndex()  # autocomplete, follows the pool
+_stats = pool_stats.PoolStats()  # supply/demand per skill, follows the pool
+_journal = None  # pool_snapshot.Journal, records changes since the last snapshot
+
+def _get_pool() -> matcher.MatchIndex:
+    """
+    In-memory match index over the sheet, loaded once and then kept in sync.
+    Loaded from the local snapshot + journal when there is one, else from the sheet.
+    """
+    global _pool, _skills, _stats, _journal
+    if _pool is None:
+        _skills, _stats = skill_index.SkillIndex(), pool_stats.PoolStats()
+        pool = matcher.MatchIndex(listeners=[_skills, _stats])
+        try:
+            _journal = pool_snapshot.load(pool)
+        except Exception:
+            logger.exception("Could not load pool snapshot")
+            _skills, _stats = skill_index.SkillIndex(), pool_stats.PoolStats()
+            pool = matcher.MatchIndex(listeners=[_skills, _stats])
+            _journal = None
+        if _journal is None:
+            for row in sheet_manager.get_all_records():
+                pool.add(row)
+            try:
+                _journal = pool_snapshot.start_fresh(pool)
+            except Exception:
+                logger.exception("Could not write pool snapshot")
+        if _journal is not None:
+            pool.listeners.append(_journal)
+        _skills.warm()
+        _pool = pool
+    return _pool
+
+_pool_lock = asyncio.Lock()
+
+async def _pool_ready() -> matcher.MatchIndex:
+    """_get_pool() for handlers: the first (full sheet) load runs in a worker thread."""
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                await asyncio.to_thread(_get_pool)
+    return _pool
+
 # ---------------- save & match ----------------
+_inflight = {}  # (user id, skill, want) -> Future of the save-and-match in progress
+
 async def _save_and_match(context: ContextTypes.DEFAULT_TYPE, reply_target: int = None):
+    """
+    Collapses duplicate submissions: the same user sending the same skill/want
+    while one is being processed, or while already waiting in the pool, costs
+    no extra sheet/Firebase calls.
+    """
+    ud = context.user_data
+    user_id = ud.get('user_id')
+    key = (user_id, matcher._clean(ud.get('skill')), matcher._clean(ud.get('want')))
+
+    running = _inflight.get(key)
+    if running is not None:
+        await asyncio.shield(running)  # the first submission sends the notifications
+        context.user_data.clear()
+        return
+
+    if user_id is not None and any(
+        (matcher._clean(r.skill), matcher._clean(r.want)) == key[1:]
+        for r in (await _pool_ready()).user_rows(user_id)
+    ):
+        try:
+            await context.bot.send_message(chat_id=reply_target or user_id,
+                                           text="You're already in the queue for this — we'll notify you when a match is available.")
+        except Exception:
+            logger.exception("Failed to send 'already waiting' message.")
+        context.user_data.clear()
+        return
+
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[key] = fut
+    try:
+        await _do_save_and_match(context, reply_target)
+    finally:
+        del _inflight[key]
+        fut.set_result(None)
+
+async def _do_save_and_match(context: ContextTypes.DEFAULT_TYPE, reply_target: int = None):
     ud = context.user_data
     user_id = ud.get('user_id')
     name = ud.get('name', "")
     skill = ud.get('skill', "") or ""
     want = ud.get('want', "") or ""
 
-    # 1) Save to sheet
+    pool = await _pool_ready()  # load before saving so the new row isn't indexed twice
+
+    # 1) Save to sheet (keep its Timestamp: expiry finds sheet rows by User ID + Timestamp)
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     try:
-        sheet_manager.save_user_row(user_id, name, skill, want)
+        ts = await asyncio.to_thread(sheet_manager.save_user_row, user_id, name, skill, want)
     except Exception as e:
         logger.exception("Failed saving to sheet: %s", e)
 
@@ -152,11 +356,15 @@ async def _save_and_match(context: ContextTypes.DEFAULT_TYPE, reply_target: int
         "Name": name,
         "Skill": skill,
         "Want": want,
-        "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "Timestamp": ts
     }
 
-    all_rows = sheet_manager.get_all_records()
-    matched = matcher.find_one_match(new_row, all_rows)
+    _stats.record_signup(new_row)
+    matched = pool.pop_match(new_row)  # longest-waiting compatible partner
+    if matched:
+        _stats.record_match(new_row, matched)
+    else:
+        pool.add(new_row)
 
     chat_id = reply_target or user_id
 
@@ -209,7 +417,7 @@ async def _save_and_match(context: ContextTypes.DEFAULT_TYPE, reply_target: int
 
        # --- NEW: delete both users from sheet by skill/want match
         try:
-            sheet_manager.delete_matched_pair(new_row)
+            await asyncio.to_thread(sheet_manager.delete_matched_pair, new_row, matched)
         except Exception as e:
             logger.exception("Failed to delete users after matching: %s", e)
 
@@ -223,8 +431,29 @@ async def _save_and_match(context: ContextTypes.DEFAULT_TYPE, reply_target: int
     context.user_data.clear()
 
 # -------------- setup & run -------------
-def main():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+async def _start_background(app):
+    while True:
+        try:
+            await _pool_ready()
+            break
+        except Exception:
+            logger.exception("Could not load the waiting pool, retrying in 60s")
+            await asyncio.sleep(60)
+    # expire stale waiting entries in the background
+    app.create_task(expiry.sweep_loop(app.bot, _get_pool))
+    app.create_task(pool_snapshot.checkpoint_loop(_get_pool, lambda: _journal))
+
+async def _post_init(app):
+    app.create_task(_start_background(app))
+
+def build_application(bot=None):
+    """Build the Application with all handlers. Pass `bot` to use a custom Bot (e.g. loadtest)."""
+    builder = ApplicationBuilder().post_init(_post_init)
+    if bot is not None:
+        builder = builder.bot(bot)
+    else:
+        builder = builder.token(BOT_TOKEN)
+    app = builder.build()
 
     conv = ConversationHandler(
         entry_points=[CommandHandler("start", start)],
@@ -242,6 +471,15 @@ def main():
         allow_reentry=True,
     )
 
+    app.add_handler(TypeHandler(Update, flood_guard), group=-1)
     app.add_handler(conv)
+    app.add_handler(InlineQueryHandler(inline_skills))
+    app.add_handler(CommandHandler("stats", stats_command))
+    app.add_handler(CommandHandler("chats", chats_command))
+    app.add_handler(CallbackQueryHandler(keep_callback, pattern=f"^{expiry.KEEP_CALLBACK}$"))
+    return app
+
+def main():
+    app = build_application()
     logging.getLogger(__name__).info("Bot starting...")
     app.run_polling()
@@ -11,47 +11,422 @@ Matching rules:
      If one user has Skill filled & Want blank
      AND the other has Skill blank & Want filled
      AND the filled values match exactly (case-insensitive).
+
+Among several compatible rows, the one that has waited longest wins
+(see MatchIndex for the configurable score).
 """
 
+import bisect
+import heapq
+from datetime import datetime
+
+
 def _clean(s):
-    return (s or "").strip().lower()
+    # runs of whitespace count as one space, so "Web  Design" == "web design"
+    return " ".join(str(s).split()).lower() if s else ""
 
-def find_one_match(new_row: dict, all_rows: list) -> dict | None:
+# ---------------- pool records ----------------
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+COLUMNS = ("User ID", "Name", "Skill", "Want", "Timestamp")
+
+
+def _epoch(ts) -> float:
+    try:
+        # same layout as TIMESTAMP_FORMAT, but parsed in C (strptime is ~20x slower)
+        return datetime.fromisoformat(str(ts)).timestamp()
+    except (TypeError, ValueError):
+        return 0.0  # unknown signup time -> treat as waiting longest
+
+
+class Interner:
     """
-    new_row: dict with keys "User ID","Name","Skill","Want","Timestamp"
-    all_rows: list of dict rows (sheet.get_all_records())
-    Returns a matched row dict or None.
+    Canonical skill text (_clean) <-> small int id. Id 0 is the blank skill.
+    The spelling shown for an id is the first one seen, with whitespace
+    collapsed like the key, so _clean(text(i)) always maps back to i.
+    """
+
+    def __init__(self):
+        self._ids = {"": 0}
+        self._text = [""]
+
+    def __len__(self):
+        return len(self._text)
+
+    def id(self, s) -> int:
+        key = _clean(s)
+        i = self._ids.get(key)
+        if i is None:
+            i = self._ids[key] = len(self._text)
+            self._text.append(" ".join(str(s).split()))
+        return i
+
+    def lookup(self, s):
+        """Id of `s` without adding it (None if never seen)."""
+        return self._ids.get(_clean(s))
+
+    def text(self, i: int) -> str:
+        return self._text[i]
+
+SKILLS = Interner()
+
+
+class PoolRecord:
+    """
+    One waiting user, compact: int user id, interned skill/want ids and epoch
+    seconds instead of a dict of header strings. `alive` is MatchIndex
+    bookkeeping; records order by (ts, user id) so with the default score they
+    sit in the bucket heaps directly.
+
+    Measured on 100k users: ~160 B per record against ~490 B per
+    get_all_records() dict; indexed in a MatchIndex it is ~235 B per user, up
+    to ~330 B when nearly every user has their own (skill, want) pair.
+
+    get() / to_row() give the sheet view ("User ID", "Skill", ...) for code that
+    talks to the sheet or to users; columns beyond COLUMNS (e.g. "Language")
+    go to `extra`, which stays None when there are none.
+    """
+    __slots__ = ("user_id", "name", "skill_id", "want_id", "ts", "extra", "alive")
+
+    def __init__(self, user_id: int, name: str, skill_id: int, want_id: int, ts: int,
+                 extra: dict = None):
+        self.user_id = user_id
+        self.name = name
+        self.skill_id = skill_id
+        self.want_id = want_id
+        self.ts = ts
+        self.extra = extra
+        self.alive = True
+
+    @classmethod
+    def from_row(cls, row) -> "PoolRecord":
+        """Build from a sheet row dict (or return `row` if it already is a record)."""
+        if isinstance(row, cls):
+            return row
+        extra = {k: v for k, v in row.items() if k not in COLUMNS} or None
+        return cls(int(row.get("User ID")), row.get("Name") or "",
+                   SKILLS.id(row.get("Skill")), SKILLS.id(row.get("Want")),
+                   int(_epoch(row.get("Timestamp"))), extra)
+
+    @property
+    def skill(self) -> str:
+        return SKILLS.text(self.skill_id)
+
+    @property
+    def want(self) -> str:
+        return SKILLS.text(self.want_id)
+
+    @property
+    def timestamp(self) -> str:
+        return datetime.fromtimestamp(self.ts).strftime(TIMESTAMP_FORMAT) if self.ts else ""
+
+    def get(self, col: str, default=None):
+        if col == "User ID":
+            return str(self.user_id)
+        if col == "Name":
+            return self.name
+        if col == "Skill":
+            return self.skill
+        if col == "Want":
+            return self.want
+        if col == "Timestamp":
+            return self.timestamp
+        return (self.extra or {}).get(col, default)
+
+    def to_row(self) -> dict:
+        row = {col: self.get(col) for col in COLUMNS}
+        if self.extra:
+            row.update(self.extra)
+        return row
+
+    def __lt__(self, other: "PoolRecord") -> bool:
+        return (self.ts, self.user_id) < (other.ts, other.user_id)
+
+    def __repr__(self):
+        return f"PoolRecord({self.to_row()!r})"
+
+
+def waiting_time_score(rec: PoolRecord) -> float:
+    """Default score: earlier signup = lower score = picked first."""
+    return rec.ts
+
+
+# ---------------- indexed pool ----------------
+class MatchIndex:
     """
-    new_uid = str(new_row.get("User ID", ""))
-    new_skill = _clean(new_row.get("Skill", ""))
-    new_want = _clean(new_row.get("Want", ""))
+    Waiting pool split into buckets by (skill, want). Every rule above boils down
+    to "the candidate's (skill, want) equals my (want, skill)", so finding a match
+    is a single bucket lookup instead of a scan.
+
+    Each bucket is a min-heap ordered by `score(rec)` (waiting time by
+    default), so the best candidate is popped in O(log n). With the default
+    score the heap holds the PoolRecords themselves; another score puts
+    (score, user id, record) entries in it instead. A bucket with a single
+    record stores that entry bare instead of a one-element list. With
+    `prefer=("Language", ...)` a bucket is further split by those columns: a
+    candidate with the same values as the seeker wins, otherwise the
+    best-scored one across the bucket. Removals are lazy (records are flagged
+    dead and skipped when they surface); a heap is rebuilt from its live
+    records once dead ones make up half of it, and dropped when it empties, so
+    expired buckets nobody searches again don't keep their records alive.
+
+    Records are also filed into `time_bucket`-second buckets by signup time so
+    the TTL sweeper (expiry.py) only walks buckets older than its cutoff.
+
+    add() takes sheet row dicts or PoolRecords; everything handed out is a
+    PoolRecord. `listeners` are objects with on_add(rec) / on_remove(rec); they
+    are told about every record entering or leaving the pool (see
+    skill_index.SkillIndex).
+    """
+
+    def __init__(self, rows=(), score=waiting_time_score, prefer=(), time_bucket=3600,
+                 listeners=()):
+        self.listeners = list(listeners)
+        self._score = score
+        self._prefer = tuple(prefer)
+        # records without extra columns all share this key (the common case)
+        self._no_pref = (tuple("" for _ in self._prefer)
+                         if not set(self._prefer) & set(COLUMNS) else None)
+        self._time_bucket = time_bucket
+        self._by_time = {}   # bucket number -> list of records
+        self._time_keys = [] # sorted bucket numbers
+        self._heaps = {}     # (skill id, want id, pref values) -> heap of entries, or one bare entry
+        self._dead = {}      # heap key -> dead records still in that heap
+        self._prefs = {}     # (skill id, want id) -> pref values seen (only with `prefer`)
+        self._by_user = {}   # user id -> live record, or a list when they have several
+        self._size = 0
+        for row in rows:
+            self.add(row)
+
+    def __len__(self):
+        return self._size
+
+    def _pref_key(self, rec) -> tuple:
+        if self._no_pref is not None and isinstance(rec, PoolRecord) and not rec.extra:
+            return self._no_pref
+        return tuple(_clean(rec.get(col, "")) for col in self._prefer)
+
+    def add(self, row) -> PoolRecord | None:
+        try:
+            rec = PoolRecord.from_row(row)
+        except (TypeError, ValueError):
+            return None  # no numeric user id -> can't be messaged anyway
+        if not rec.skill_id and not rec.want_id:
+            return None  # nothing to match on
+        rec.alive = True
+        pref = self._pref_key(rec)
+        key = (rec.skill_id, rec.want_id, pref)
+        entry = rec if self._score is waiting_time_score else (self._score(rec), rec.user_id, rec)
+        heap = self._heaps.get(key)
+        if heap is None:
+            self._heaps[key] = entry
+            if self._prefer:
+                self._prefs.setdefault((rec.skill_id, rec.want_id), set()).add(pref)
+        elif type(heap) is list:
+            heapq.heappush(heap, entry)
+        else:
+            self._heaps[key] = [heap, entry] if heap < entry else [entry, heap]
+        cur = self._by_user.get(rec.user_id)
+        if cur is None:
+            self._by_user[rec.user_id] = rec
+        elif isinstance(cur, list):
+            cur.append(rec)
+        else:
+            self._by_user[rec.user_id] = [cur, rec]
+        self._size += 1
 
-    # iterate newest rows first
-    for row in reversed(all_rows):
+        b = rec.ts // self._time_bucket
+        if b not in self._by_time:
+            self._by_time[b] = []
+            bisect.insort(self._time_keys, b)
+        self._by_time[b].append(rec)
+        for listener in self.listeners:
+            listener.on_add(rec)
+        return rec
+
+    def remove(self, row) -> bool:
+        """Remove `row` (the same record, else matched on User ID + Skill + Want). True if found."""
         try:
-            other_uid = str(row.get("User ID", ""))
-        except Exception:
-            continue
-        if other_uid == new_uid:
-            continue  # skip self
+            uid = row.user_id if isinstance(row, PoolRecord) else int(row.get("User ID"))
+        except (TypeError, ValueError):
+            return False
+        recs = self.user_rows(uid)
+        idx = next((i for i, r in enumerate(recs) if r is row), None)
+        if idx is None:
+            key = (SKILLS.lookup(row.get("Skill")), SKILLS.lookup(row.get("Want")))
+            idx = next((i for i, r in enumerate(recs) if (r.skill_id, r.want_id) == key), None)
+        if idx is None:
+            return False
+        rec = recs.pop(idx)
+        self._kill(rec)
+        if not recs:
+            del self._by_user[uid]
+        else:
+            self._by_user[uid] = recs if len(recs) > 1 else recs[0]
+        self._size -= 1
+        for listener in self.listeners:
+            listener.on_remove(rec)
+        return True
+
+    def remove_user(self, user_id) -> int:
+        """Drop every waiting record of a user. Returns how many were removed."""
+        recs = self.user_rows(user_id)
+        self._by_user.pop(int(user_id), None)
+        for rec in recs:
+            self._kill(rec)
+            for listener in self.listeners:
+                listener.on_remove(rec)
+        self._size -= len(recs)
+        return len(recs)
+
+    def rows(self):
+        """Iterate over all live waiting records."""
+        for cur in self._by_user.values():
+            if isinstance(cur, list):
+                yield from cur
+            else:
+                yield cur
+
+    def user_rows(self, user_id) -> list:
+        """Live waiting records of one user (a new list)."""
+        cur = self._by_user.get(int(user_id))
+        if cur is None:
+            return []
+        return list(cur) if isinstance(cur, list) else [cur]
 
-        other_skill = _clean(row.get("Skill", ""))
-        other_want = _clean(row.get("Want", ""))
+    def iter_older_than(self, cutoff: float):
+        """
+        Yield live records whose signup time (epoch seconds) is before `cutoff`,
+        oldest bucket first. Only buckets that start before the cutoff are visited;
+        dead records found on the way are compacted out.
+        """
+        last = int(cutoff // self._time_bucket)
+        i = 0
+        while i < len(self._time_keys) and self._time_keys[i] <= last:
+            b = self._time_keys[i]
+            live = [r for r in self._by_time[b] if r.alive]
+            if not live:
+                del self._by_time[b]
+                del self._time_keys[i]
+                continue
+            self._by_time[b] = live
+            for rec in live:
+                if rec.ts < cutoff and rec.alive:
+                    yield rec
+            i += 1
 
-        # Rule 1: both filled -> mutual exact swap
-        if new_skill and new_want and other_skill and other_want:
-            if new_skill == other_want and new_want == other_skill:
-                return row
+    def pop_older_than(self, cutoff: float) -> list:
+        """Remove and return every live record that signed up before `cutoff`."""
+        recs = list(self.iter_older_than(cutoff))
+        for rec in recs:
+            self.remove(rec)
+        return recs
 
-        # Rule 2: cross match (one has skill, one has want)
-        if new_skill and not new_want and not other_skill and other_want:
-            if new_skill == other_want:
-                return row
+    @staticmethod
+    def _rec(entry) -> PoolRecord:
+        return entry if type(entry) is PoolRecord else entry[2]
 
-        if not new_skill and new_want and other_skill and not other_want:
-            if new_want == other_skill:
-                return row
+    def _kill(self, rec: PoolRecord):
+        """Flag `rec` dead; compact its heap once dead records make up half of it."""
+        rec.alive = False
+        key = (rec.skill_id, rec.want_id, self._pref_key(rec))
+        heap = self._heaps.get(key)
+        if heap is None:
+            return
+        if type(heap) is not list:
+            if self._rec(heap) is rec:
+                self._drop_heap(key)
+            return
+        dead = self._dead.get(key, 0) + 1
+        if 2 * dead < len(heap):
+            self._dead[key] = dead
+            return
+        self._dead.pop(key, None)
+        live = [e for e in heap if self._rec(e).alive]
+        if len(live) > 1:
+            heapq.heapify(live)
+            self._heaps[key] = live
+        elif live:
+            self._heaps[key] = live[0]
+        else:
+            self._drop_heap(key)
+
+    def _drop_heap(self, key):
+        del self._heaps[key]
+        self._dead.pop(key, None)
+        if self._prefer:
+            prefs = self._prefs[key[:2]]
+            prefs.discard(key[2])
+            if not prefs:
+                del self._prefs[key[:2]]
+
+    def _best(self, key, skip_uid):
+        """Top live entry of heap `key` not owned by `skip_uid`, or None. Drops dead records on the way."""
+        heap = self._heaps.get(key)
+        if heap is None:
+            return None
+        if type(heap) is not list:
+            return None if self._rec(heap).user_id == skip_uid else heap
+        held = []
+        found = None
+        while heap:
+            entry = heap[0]
+            rec = self._rec(entry)
+            if not rec.alive:
+                heapq.heappop(heap)
+                dead = self._dead.get(key, 0) - 1
+                if dead > 0:
+                    self._dead[key] = dead
+                else:
+                    self._dead.pop(key, None)
+                continue
+            if rec.user_id == skip_uid:
+                held.append(heapq.heappop(heap))
+                continue
+            found = entry
+            break
+        for entry in held:
+            heapq.heappush(heap, entry)
+        if not heap:
+            self._drop_heap(key)
+        return found
+
+    def find(self, new_row) -> PoolRecord | None:
+        """Best waiting record compatible with `new_row` (not removed), or None."""
+        skill_id = SKILLS.lookup(new_row.get("Skill", ""))
+        want_id = SKILLS.lookup(new_row.get("Want", ""))
+        if skill_id is None or want_id is None or (not skill_id and not want_id):
+            return None  # a skill nobody has mentioned can't have a partner
+        try:
+            uid = int(new_row.get("User ID", ""))
+        except (TypeError, ValueError):
+            uid = None
+        if not self._prefer:
+            best = self._best((want_id, skill_id, ()), uid)
+        else:
+            best = self._best((want_id, skill_id, self._pref_key(new_row)), uid)
+            if best is None:
+                for pref in list(self._prefs.get((want_id, skill_id), ())):
+                    entry = self._best((want_id, skill_id, pref), uid)
+                    if entry is not None and (best is None or entry < best):
+                        best = entry
+        return None if best is None else self._rec(best)
 
-        # No match otherwise
+    def pop_match(self, new_row) -> PoolRecord | None:
+        """find() + remove() in one go."""
+        match = self.find(new_row)
+        if match is not None:
+            self.remove(match)
+        return match
 
-    return None
+
+def find_one_match(new_row: dict, all_rows: list) -> dict | None:
+    """
+    new_row: dict with keys "User ID","Name","Skill","Want","Timestamp"
+    all_rows: list of dict rows (sheet.get_all_records())
+    Returns the longest-waiting matched row dict or None.
+
+    One-off helper: builds a throwaway MatchIndex (O(n)). Long-lived callers
+    should keep a MatchIndex around and use find()/pop_match().
+    """
+    match = MatchIndex(all_rows).find(new_row)
+    return match.to_row() if match else None
@@ -0,0 +1,260 @@
+# pool_snapshot.py
+"""
+Checkpoint of the waiting pool so a restart doesn't have to download the whole
+sheet again.
+
+Files in POOL_STATE_DIR (default ./pool_state):
+    pool.snap           binary snapshot, read back through mmap
+    journal.<gen>.jsonl pool changes (add / remove) made after snapshot <gen>
+
+Snapshot layout (little endian):
+    header   8s magic, I version, I generation, I n_strings, I n_records
+    offsets  (n_strings + 1) x Q   byte offsets into the string blob
+    strings  utf-8 blob (names, skill texts, extra columns as JSON; each
+             distinct value once)
+    records  n_records x (q user id, I name, I skill, I want, q epoch seconds,
+             I extra)   extra = NO_EXTRA when the record has none
+
+On boot load() maps the snapshot, builds PoolRecords straight from the
+fixed-width records (each skill string is interned once, timestamps are
+already epoch seconds) and replays journals with generation >= the
+snapshot's. checkpoint()
+rotates the journal first and then writes the new snapshot to a temp file and
+renames it, so a crash at any point still leaves snapshot + journals that
+replay to the current pool.
+
+Only changes made through this process are journaled; rows added to or removed
+from the sheet by hand are picked up by deleting pool.snap (full reload).
+"""
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+
+from matcher import SKILLS, PoolRecord
+
+logger = logging.getLogger(__name__)
+
+POOL_STATE_DIR = os.getenv("POOL_STATE_DIR", "pool_state")
+SNAPSHOT_INTERVAL = int(os.getenv("POOL_SNAPSHOT_INTERVAL", "900"))  # seconds
+
+MAGIC = b"SSPOOL\x00\x01"
+VERSION = 2
+_HEADER = struct.Struct("<8sIIII")
+_OFFSET = struct.Struct("<Q")
+_RECORD = struct.Struct("<qIIIqI")
+NO_EXTRA = 0xFFFFFFFF
+_SNAP = "pool.snap"
+
+
+def _path(name: str) -> str:
+    return os.path.join(POOL_STATE_DIR, name)
+
+
+def _journal_name(gen: int) -> str:
+    return f"journal.{gen:08d}.jsonl"
+
+
+def _journal_gens() -> list:
+    try:
+        names = os.listdir(POOL_STATE_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(int(n.split(".")[1]) for n in names
+                  if n.startswith("journal.") and n.endswith(".jsonl"))
+
+
+# ---------------- snapshot file ----------------
+def write_snapshot(path: str, records, generation: int) -> int:
+    """Write PoolRecords as a snapshot file. Returns the number of records written."""
+    strings, ids, packed = [], {}, []
+
+    def intern(s: str) -> int:
+        i = ids.get(s)
+        if i is None:
+            i = ids[s] = len(strings)
+            strings.append(s)
+        return i
+
+    for rec in records:
+        extra = (intern(json.dumps(rec.extra, ensure_ascii=False, sort_keys=True))
+                 if rec.extra else NO_EXTRA)
+        packed.append(_RECORD.pack(rec.user_id, intern(rec.name), intern(rec.skill),
+                                   intern(rec.want), rec.ts, extra))
+
+    blobs = [s.encode("utf-8") for s in strings]
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, generation, len(strings), len(packed)))
+        pos = 0
+        for b in blobs:
+            f.write(_OFFSET.pack(pos))
+            pos += len(b)
+        f.write(_OFFSET.pack(pos))
+        for b in blobs:
+            f.write(b)
+        for r in packed:
+            f.write(r)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(packed)
+
+
+def read_snapshot(path: str):
+    """Return (generation, iterator of PoolRecords) for a snapshot file, or None if missing/invalid."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        if os.fstat(f.fileno()).st_size < _HEADER.size:
+            return None
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, gen, n_strings, n_records = _HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or version != VERSION:
+        mm.close()
+        return None
+
+    def records():
+        try:
+            offsets_at = _HEADER.size
+            blob_at = offsets_at + (n_strings + 1) * _OFFSET.size
+            offsets = [o for (o,) in _OFFSET.iter_unpack(mm[offsets_at:blob_at])]
+            records_at = blob_at + offsets[-1]
+            text = [None] * n_strings   # string index -> str
+            skill = [None] * n_strings  # string index -> SKILLS id
+            extra = {}                  # string index -> dict (shared, records never mutate it)
+
+            def s(i):
+                v = text[i]
+                if v is None:
+                    v = text[i] = mm[blob_at + offsets[i]:blob_at + offsets[i + 1]].decode("utf-8")
+                return v
+
+            def sid(i):
+                v = skill[i]
+                if v is None:
+                    v = skill[i] = SKILLS.id(s(i))
+                return v
+
+            view = memoryview(mm)[records_at:records_at + n_records * _RECORD.size]
+            try:
+                for uid, name, sk, want, ts, ex in _RECORD.iter_unpack(view):
+                    if ex == NO_EXTRA:
+                        ex = None
+                    else:
+                        d = extra.get(ex)
+                        if d is None:
+                            d = extra[ex] = json.loads(s(ex))
+                        ex = d
+                    yield PoolRecord(uid, s(name), sid(sk), sid(want), ts, ex)
+            finally:
+                view.release()
+        finally:
+            mm.close()
+
+    return gen, records()
+
+
+# ---------------- journal ----------------
+class Journal:
+    """MatchIndex listener appending every pool change to the current journal file."""
+
+    def __init__(self, generation: int):
+        os.makedirs(POOL_STATE_DIR, exist_ok=True)
+        self.generation = generation
+        self._f = open(_path(_journal_name(generation)), "a", encoding="utf-8")
+
+    def _write(self, op: str, rec):
+        self._f.write(json.dumps({"op": op, "row": rec.to_row()}, ensure_ascii=False) + "\n")
+        self._f.flush()
+
+    def on_add(self, rec):
+        self._write("add", rec)
+
+    def on_remove(self, rec):
+        self._write("remove", rec)
+
+    def rotate(self):
+        """Start journal generation + 1; returns the new generation."""
+        self._f.close()
+        self.generation += 1
+        self._f = open(_path(_journal_name(self.generation)), "a", encoding="utf-8")
+        return self.generation
+
+
+def _replay(pool, gen: int) -> int:
+    n = 0
+    with open(_path(_journal_name(gen)), encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # torn last line after a crash
+            if entry["op"] == "add":
+                pool.add(entry["row"])
+            else:
+                pool.remove(entry["row"])
+            n += 1
+    return n
+
+
+# ---------------- load / checkpoint ----------------
+def load(pool) -> Journal | None:
+    """
+    Fill `pool` from the snapshot plus newer journals and return the Journal to
+    attach as a listener. Returns None (pool untouched) when there is no snapshot.
+    """
+    snap = read_snapshot(_path(_SNAP))
+    if snap is None:
+        return None
+    gen, records = snap
+    for rec in records:
+        pool.add(rec)
+    gens = [g for g in _journal_gens() if g >= gen]
+    for g in gens:
+        _replay(pool, g)
+    return Journal(max(gens, default=gen))
+
+
+def start_fresh(pool) -> Journal:
+    """Pool was loaded from the sheet: forget old journals and checkpoint right away."""
+    for g in _journal_gens():
+        os.remove(_path(_journal_name(g)))
+    journal = Journal(0)
+    checkpoint(pool, journal)
+    return journal
+
+
+def _write_and_prune(records: list, gen: int) -> int:
+    n = write_snapshot(_path(_SNAP), records, gen)
+    for g in _journal_gens():
+        if g < gen:
+            os.remove(_path(_journal_name(g)))
+    return n
+
+
+def checkpoint(pool, journal: Journal) -> int:
+    """Snapshot the pool and drop journals it covers. Returns the number of records written."""
+    records = list(pool.rows())
+    gen = journal.rotate()  # changes from here on go to the new journal
+    return _write_and_prune(records, gen)
+
+
+async def checkpoint_loop(get_pool, get_journal):
+    """Periodic checkpoint; the file is written in a worker thread."""
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        try:
+            pool, journal = get_pool(), get_journal()
+            if journal is None:
+                continue
+            records = list(pool.rows())
+            gen = journal.rotate()
+            n = await asyncio.to_thread(_write_and_prune, records, gen)
+            logger.info("Pool snapshot %d written (%d records)", gen, n)
+        except Exception:
+            logger.exception("Pool snapshot failed")
@@ -0,0 +1,132 @@
+# pool_stats.py
+"""
+Supply / demand counters per canonical skill, kept up to date incrementally.
+
+    offers / wants   live counts of waiting rows with that Skill / Want
+                     (MatchIndex listener: follows saves, matches, expiry)
+    signups          rows saved for that skill since the bot started
+    matches          matched signups for that skill (both sides of a match)
+    wait_total       seconds the waiting side had been in the pool when matched
+
+top_imbalances(n) picks the n skills with the largest |offers - wants| from
+the k tracked skills in O(k log n), with no storage reads.
+"""
+import heapq
+import time
+
+from matcher import _clean, _epoch
+
+
+class SkillStats:
+    __slots__ = ("name", "offers", "wants", "signups", "matches", "wait_total", "waits")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.offers = 0
+        self.wants = 0
+        self.signups = 0
+        self.matches = 0
+        self.wait_total = 0.0
+        self.waits = 0
+
+    @property
+    def imbalance(self) -> int:
+        """> 0: more people offer it than want it; < 0: demand outstrips supply."""
+        return self.offers - self.wants
+
+    @property
+    def match_rate(self) -> float:
+        # capped: rows loaded at boot can match without their signup being counted
+        return min(1.0, self.matches / self.signups) if self.signups else 0.0
+
+    @property
+    def avg_wait(self) -> float:
+        return self.wait_total / self.waits if self.waits else 0.0
+
+
+class PoolStats:
+    def __init__(self):
+        self._skills = {}  # canonical -> SkillStats
+
+    def _get(self, skill: str):
+        key = _clean(skill)
+        if not key:
+            return None
+        st = self._skills.get(key)
+        if st is None:
+            st = self._skills[key] = SkillStats(" ".join(skill.split()))
+        return st
+
+    def _drop_if_empty(self, st: SkillStats):
+        if not (st.offers or st.wants or st.signups):
+            del self._skills[_clean(st.name)]
+
+    # ---- MatchIndex listener ----
+    def on_add(self, row: dict):
+        st = self._get(row.get("Skill", ""))
+        if st:
+            st.offers += 1
+        st = self._get(row.get("Want", ""))
+        if st:
+            st.wants += 1
+
+    def on_remove(self, row: dict):
+        for col, attr in (("Skill", "offers"), ("Want", "wants")):
+            st = self._skills.get(_clean(row.get(col, "")))
+            if st:
+                setattr(st, attr, max(0, getattr(st, attr) - 1))
+                self._drop_if_empty(st)
+
+    # ---- events from the signup flow ----
+    def _row_skills(self, row: dict) -> list:
+        """SkillStats for the row's Skill and Want (once if they're the same skill)."""
+        found = {}
+        for col in ("Skill", "Want"):
+            st = self._get(row.get(col, ""))
+            if st:
+                found[id(st)] = st
+        return list(found.values())
+
+    def record_signup(self, row: dict):
+        for st in self._row_skills(row):
+            st.signups += 1
+
+    def record_match(self, new_row: dict, matched: dict, now: float = None):
+        """`new_row` just signed up and was matched with the waiting `matched` row."""
+        now = time.time() if now is None else now
+        ts = _epoch(matched.get("Timestamp"))
+        waited = max(0.0, now - ts) if ts else None
+        # both signups ended in this match, so both rows count it
+        for st in self._row_skills(matched) + self._row_skills(new_row):
+            st.matches += 1
+        for st in self._row_skills(new_row):
+            if waited is not None:
+                st.wait_total += waited
+                st.waits += 1
+
+    # ---- queries ----
+    def __len__(self):
+        return len(self._skills)
+
+    def get(self, skill: str):
+        return self._skills.get(_clean(skill))
+
+    def top_imbalances(self, n: int = 10) -> list:
+        """Up to n skills with the largest |offers - wants|; balanced skills are left out."""
+        return heapq.nlargest(n, (st for st in self._skills.values() if st.imbalance),
+                              key=lambda st: abs(st.imbalance))
+
+
+def format_report(stats: PoolStats, n: int = 10) -> str:
+    top = stats.top_imbalances(n)
+    if not top:
+        return "📊 The pool is empty." if not len(stats) else "📊 Every skill in the pool is balanced."
+    lines = [f"📊 Top {len(top)} skill imbalances ({len(stats)} skills tracked)", ""]
+    for st in top:
+        side = "oversupplied" if st.imbalance > 0 else "overdemanded"
+        lines.append(
+            f"• {st.name}: {side} by {abs(st.imbalance)} "
+            f"(offers {st.offers}, wants {st.wants}, "
+            f"match rate {st.match_rate:.0%}, avg wait {st.avg_wait / 3600:.1f}h)"
+        )
+    return "\n".join(lines)
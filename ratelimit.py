@@ -0,0 +1,93 @@
+# ratelimit.py
+"""
+Token-bucket flood control for incoming updates.
+
+Every user has a bucket of RATE_USER_BURST tokens refilled at RATE_USER_PER_MIN
+per minute; one shared bucket (RATE_GLOBAL_BURST, RATE_GLOBAL_PER_SEC per second)
+caps the whole bot. /start costs START_COST tokens, anything else 1, so a
+normal signup (/start + 4 steps) fits in a burst but repeated restarts or
+button mashing run dry quickly.
+
+Inline queries (skill autocomplete) arrive once per keystroke, so main_bot
+checks them against a separate FloodGuard with the larger RATE_INLINE_*
+limits instead of the signup bucket.
+"""
+import os
+import time
+
+RATE_USER_PER_MIN = float(os.getenv("RATE_USER_PER_MIN", "20"))
+RATE_USER_BURST = float(os.getenv("RATE_USER_BURST", "10"))
+RATE_GLOBAL_PER_SEC = float(os.getenv("RATE_GLOBAL_PER_SEC", "25"))
+RATE_GLOBAL_BURST = float(os.getenv("RATE_GLOBAL_BURST", "100"))
+RATE_INLINE_PER_MIN = float(os.getenv("RATE_INLINE_PER_MIN", "120"))
+RATE_INLINE_BURST = float(os.getenv("RATE_INLINE_BURST", "30"))
+START_COST = 3
+
+_MAX_IDLE_BUCKETS = 10_000  # prune full buckets once we track more users than this
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "stamp")
+
+    def __init__(self, rate: float, capacity: float, now: float = None):
+        self.rate = rate          # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic() if now is None else now
+
+    def _refill(self, now: float):
+        if now > self.stamp:
+            self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+
+    def take(self, cost: float = 1.0, now: float = None) -> float:
+        """Take `cost` tokens. Returns 0 on success, else seconds until they'd be available."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate else float("inf")
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class FloodGuard:
+    def __init__(self, user_per_min=RATE_USER_PER_MIN, user_burst=RATE_USER_BURST,
+                 global_per_sec=RATE_GLOBAL_PER_SEC, global_burst=RATE_GLOBAL_BURST):
+        self._user_rate = user_per_min / 60.0
+        self._user_burst = user_burst
+        self._global = TokenBucket(global_per_sec, global_burst)
+        self._users = {}         # user id -> TokenBucket
+        self._warned_until = {}  # user id -> monotonic time until which we stay quiet
+
+    def check(self, user_id: int, cost: float = 1.0, now: float = None) -> float:
+        """0 if the update may proceed, else the suggested wait in seconds."""
+        now = time.monotonic() if now is None else now
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            if len(self._users) >= _MAX_IDLE_BUCKETS:
+                self._prune(now)
+            bucket = self._users[user_id] = TokenBucket(self._user_rate, self._user_burst, now)
+        wait = bucket.take(cost, now)
+        if wait:
+            return wait
+        wait = self._global.take(1.0, now)
+        if wait:
+            bucket.tokens += cost  # refused globally: don't charge the user
+        return wait
+
+    def should_warn(self, user_id: int, wait: float, now: float = None) -> bool:
+        """Only one cooldown reply per blocked period, so the spam doesn't get echoed back."""
+        now = time.monotonic() if now is None else now
+        if self._warned_until.get(user_id, 0) > now:
+            return False
+        self._warned_until[user_id] = now + wait
+        return True
+
+    def _prune(self, now: float):
+        for uid in [u for u, b in self._users.items() if b.full(now)]:
+            del self._users[uid]
+        self._warned_until = {u: t for u, t in self._warned_until.items() if t > now}
@@ -1,11 +1,20 @@
 # sheet_manager.py
 import os
 import json
+import random
+import threading
+import time
+from collections import deque
 import gspread
+import requests
 from datetime import datetime
+from google.auth.transport.requests import AuthorizedSession
 from google.oauth2.service_account import Credentials
 
 SHEET_NAME = os.getenv("SHEET_NAME", "SkillSwapper")
+SHEETS_POOL_SIZE = int(os.getenv("SHEETS_POOL_SIZE", "10"))
+SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+SHEETS_QUOTA_PER_MINUTE = int(os.getenv("SHEETS_QUOTA_PER_MINUTE", "60"))
 
 # Build creds from secret JSON
 sa = json.loads(os.environ["GSHEETS_SERVICE_ACCOUNT_JSON"])
@@ -14,50 +23,184 @@ scopes = [
     "https://www.googleapis.com/auth/drive"
 ]
 creds = Credentials.from_service_account_info(sa, scopes=scopes)
-gc = gspread.authorize(creds)
-sheet = gc.open(SHEET_NAME).sheet1
 
+# One keep-alive session shared by every call
+session = AuthorizedSession(creds)
+_adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=SHEETS_POOL_SIZE)
+session.mount("https://", _adapter)
+gc = gspread.Client(auth=creds, session=session)
 
-def save_user_row(user_id: int, name: str, skill: str, want: str):
+
+# ---------------- quota / retry / coalescing ----------------
+class _QuotaBudget:
+    """At most `per_minute` requests in any 60s window; acquire() blocks until one is free."""
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self._sent = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._sent and now - self._sent[0] >= 60:
+                    self._sent.popleft()
+                if len(self._sent) < self.per_minute:
+                    self._sent.append(now)
+                    return
+                wait = 60 - (now - self._sent[0])
+            time.sleep(wait)
+
+_budget = _QuotaBudget(SHEETS_QUOTA_PER_MINUTE)
+
+
+def _status(e: Exception):
+    resp = getattr(e, "response", None)
+    return getattr(resp, "status_code", None)
+
+
+def _call(fn, *args, retry_5xx=True, **kwargs):
+    """
+    Run one Sheets request inside the quota budget, retrying 429 (and 5xx when
+    `retry_5xx`) with exponential backoff + full jitter. Non-idempotent writes
+    pass retry_5xx=False: a 5xx may have been applied, a 429 never is.
+    """
+    for attempt in range(SHEETS_MAX_RETRIES + 1):
+        _budget.acquire()
+        try:
+            return fn(*args, **kwargs)
+        except (gspread.exceptions.APIError, requests.exceptions.ConnectionError) as e:
+            code = _status(e)
+            retryable = code == 429 or (retry_5xx and (code is None or code >= 500))
+            if not retryable or attempt == SHEETS_MAX_RETRIES:
+                raise
+            time.sleep(random.uniform(0, min(32.0, 0.5 * 2 ** attempt)))
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# Held across every read-row-numbers-then-write sequence: a delete shifts the
+# rows below it, so row numbers read by another thread would hit the wrong users.
+_rows_lock = threading.Lock()
+
+
+def _single_flight(key, fn, *args):
+    """
+    Concurrent callers with the same `key` share one in-flight request and its result.
+    Only for plain reads: a joined request may have started before the caller's
+    own last write, so reads that pick rows to delete/update must not use it.
+    """
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = {"done": threading.Event()}
+    if not leader:
+        call["done"].wait()
+        if "error" in call:
+            raise call["error"]
+        return call["result"]
+    try:
+        call["result"] = _call(fn, *args)
+        return call["result"]
+    except Exception as e:
+        call["error"] = e
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+        call["done"].set()
+
+
+sheet = _call(gc.open, SHEET_NAME).sheet1
+
+
+def save_user_row(user_id: int, name: str, skill: str, want: str) -> str:
+    """Append the signup row; returns the Timestamp written (rows are found by User ID + Timestamp)."""
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     row = [str(user_id), name or "", skill or "", want or "", ts]
-    sheet.append_row(row)
+    _call(sheet.append_row, row, retry_5xx=False)
+    return ts
 
 
 def get_all_records():
-    return sheet.get_all_records()
+    return _single_flight("get_all_records", sheet.get_all_records)
 
 
-from matcher import find_one_match  # ADD THIS AT TOP
+from matcher import _clean, find_one_match  # ADD THIS AT TOP
 
-def delete_matched_pair(new_row: dict):
+def delete_matched_pair(new_row: dict, match: dict = None):
     """
     Delete both users (the new_row and the matched row) based on Skill/Want matching rules.
+    Pass `match` when the caller already picked the partner (e.g. from a MatchIndex).
+    Only rows of those two users with those Skill/Want values are removed.
     """
-    all_rows = sheet.get_all_records()
-    match = find_one_match(new_row, all_rows)
+    with _rows_lock:
+        return _delete_matched_pair(new_row, match)
+
+
+def _delete_matched_pair(new_row: dict, match: dict = None):
+    records = _call(sheet.get_all_records)  # not single-flight: row numbers feed a write
+    if match is None:
+        match = find_one_match(new_row, records)
     if not match:
         return False
 
-    def _clean(s):
-        return (s or "").strip().lower()
+    def _key(r):
+        return (str(r.get("User ID", "")), _clean(r.get("Skill")), _clean(r.get("Want")))
 
-    new_skill = _clean(new_row.get("Skill"))
-    new_want = _clean(new_row.get("Want"))
-    match_skill = _clean(match.get("Skill"))
-    match_want = _clean(match.get("Want"))
+    targets = {_key(new_row), _key(match)}
 
-    # Collect rows to delete (find them in the sheet by comparing skill/want)
-    records = sheet.get_all_records()
+    # Collect rows to delete (find them in the sheet by user + skill/want)
     rows_to_delete = []
     for i, record in enumerate(records, start=2):  # row 1 is header
-        skill = _clean(record.get("Skill"))
-        want = _clean(record.get("Want"))
-        if (skill == new_skill and want == new_want) or \
-           (skill == match_skill and want == match_want):
+        if _key(record) in targets:
             rows_to_delete.append(i)
 
     for row in sorted(rows_to_delete, reverse=True):
-        sheet.delete_rows(row)
+        _call(sheet.delete_rows, row, retry_5xx=False)
 
     return True
+
+
+def _row_numbers(rows: list) -> list:
+    """
+    Sheet row numbers of the given records, matched on User ID + Timestamp.
+    Reads only those two columns instead of the whole sheet. Call with _rows_lock held.
+    """
+    wanted = {(str(r.get("User ID", "")), str(r.get("Timestamp", ""))) for r in rows}
+    ids, stamps = _call(sheet.batch_get, ["A2:A", "E2:E"])  # not single-flight: row numbers feed a write
+    found = []
+    for i in range(max(len(ids), len(stamps))):
+        uid = ids[i][0] if i < len(ids) and ids[i] else ""
+        ts = stamps[i][0] if i < len(stamps) and stamps[i] else ""
+        if (str(uid), str(ts)) in wanted:
+            found.append(i + 2)  # row 1 is header
+    return found
+
+
+def delete_rows_batch(rows: list) -> int:
+    """Delete the given records in one batchUpdate call. Returns how many rows were deleted."""
+    with _rows_lock:
+        numbers = _row_numbers(rows)
+        if not numbers:
+            return 0
+        deletes = [{
+            "deleteDimension": {
+                "range": {"sheetId": sheet.id, "dimension": "ROWS",
+                          "startIndex": n - 1, "endIndex": n}
+            }
+        } for n in sorted(numbers, reverse=True)]  # bottom-up so indexes stay valid
+        _call(sheet.spreadsheet.batch_update, {"requests": deletes}, retry_5xx=False)
+        return len(numbers)
+
+
+def touch_rows(rows: list, ts: str) -> int:
+    """Set Timestamp of the given records to `ts` (used when a user re-confirms)."""
+    with _rows_lock:
+        numbers = _row_numbers(rows)
+        if numbers:
+            _call(sheet.batch_update, [{"range": f"E{n}", "values": [[ts]]} for n in numbers])
+        return len(numbers)
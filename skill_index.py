@@ -0,0 +1,134 @@
+# skill_index.py
+"""
+Prefix index over the skills people in the waiting pool offer or want, used for
+autocomplete (inline queries / suggestion buttons).
+
+Skills are kept canonical (matcher._clean, the key the pool matches on) in a
+sorted list, so all skills starting with a prefix are one bisect range. The
+top-k most frequent skills are cached for short prefixes and for any prefix
+whose range is wider than CACHE_MIN_RANGE (built on first lookup), and
+patched in place as counts change; narrow ranges are cheap to scan. Each cached list is an exact
+top-n with some slack over k; it is only rebuilt when decrements shrink it
+below k.
+
+Registered as a MatchIndex listener, so it follows every add / match / expiry.
+"""
+import bisect
+import heapq
+
+from matcher import _clean
+
+TOP_K = 10
+CACHE_PREFIX_LEN = 3  # prefixes up to this length keep a precomputed top-k
+CACHE_MIN_RANGE = 256  # longer prefixes are cached once their range is this wide
+
+
+class SkillIndex:
+    def __init__(self, k: int = TOP_K):
+        self.k = k
+        self._counts = {}   # canonical -> number of waiting rows mentioning it
+        self._display = {}  # canonical -> spelling shown to users
+        self._keys = []     # sorted canonicals
+        self._cap = 2 * k   # cached lists keep some slack so decrements rarely force a rebuild
+        self._top = {}      # prefix -> exact top-n canonicals (n <= cap), best first
+        self._complete = set()  # prefixes whose cached list holds every matching skill
+
+    def __len__(self):
+        return len(self._keys)
+
+    # ---- MatchIndex listener ----
+    def on_add(self, row: dict):
+        for col in ("Skill", "Want"):
+            self.add(row.get(col, ""))
+
+    def on_remove(self, row: dict):
+        for col in ("Skill", "Want"):
+            self.discard(row.get(col, ""))
+
+    # ---- updates ----
+    def add(self, skill: str):
+        key = _clean(skill)
+        if not key:
+            return
+        if key not in self._counts:
+            self._counts[key] = 0
+            self._display[key] = " ".join(skill.split())
+            bisect.insort(self._keys, key)
+        self._counts[key] += 1
+        for p in self._cached_prefixes(key):
+            top = self._top[p]
+            if key in top:
+                top.remove(key)
+            elif not (p in self._complete or self._rank(key) < self._rank(top[-1])):
+                continue  # still ranks below everything we keep for this prefix
+            bisect.insort(top, key, key=self._rank)
+            if len(top) > self._cap:
+                del top[self._cap:]
+                self._complete.discard(p)
+
+    def discard(self, skill: str):
+        key = _clean(skill)
+        if key not in self._counts:
+            return
+        self._counts[key] -= 1
+        gone = self._counts[key] <= 0
+        for p in self._cached_prefixes(key):
+            top = self._top[p]
+            if key not in top:
+                continue
+            top.remove(key)
+            # a lower count may now rank below keys we don't keep; the rest stays exact
+            if not gone and (p in self._complete or not top
+                             or self._rank(key) <= self._rank(top[-1])):
+                bisect.insort(top, key, key=self._rank)
+            if len(top) < self.k and p not in self._complete:
+                del self._top[p]  # rebuilt on the next lookup
+        if gone:
+            del self._counts[key]
+            del self._display[key]
+            del self._keys[bisect.bisect_left(self._keys, key)]
+
+    def _cached_prefixes(self, key: str):
+        if not self._top:
+            return ()  # nothing cached yet (e.g. bulk load before warm())
+        return [key[:n] for n in range(len(key) + 1) if key[:n] in self._top]
+
+    def _rank(self, key: str):
+        return (-self._counts[key], key)
+
+    def warm(self):
+        """Precompute top-k for the empty and 1-letter prefixes (the widest ranges) in one pass."""
+        ranges = {"": self._keys}
+        for key in self._keys:
+            ranges.setdefault(key[:1], []).append(key)
+        for p, keys in ranges.items():
+            self._store(p, keys)
+
+    # ---- lookups ----
+    def _range(self, prefix: str):
+        lo = bisect.bisect_left(self._keys, prefix)
+        hi = bisect.bisect_left(self._keys, prefix + "\U0010ffff")
+        return lo, hi
+
+    def _store(self, prefix: str, keys: list) -> list:
+        top = heapq.nsmallest(self._cap, keys, key=self._rank)
+        if len(prefix) <= CACHE_PREFIX_LEN or len(keys) >= CACHE_MIN_RANGE:
+            self._top[prefix] = top
+            if len(top) == len(keys):
+                self._complete.add(prefix)
+            else:
+                self._complete.discard(prefix)
+        return top
+
+    def _top_for(self, prefix: str) -> list:
+        top = self._top.get(prefix)
+        if top is None:
+            lo, hi = self._range(prefix)
+            top = self._store(prefix, self._keys[lo:hi])
+        return top
+
+    def suggest(self, prefix: str, limit: int = None) -> list:
+        """Most popular skills starting with `prefix`, as (display name, count) pairs."""
+        limit = min(limit or self.k, self.k)
+        return [(self._display[key], self._counts[key])
+                for key in self._top_for(_clean(prefix))[:limit]]
@@ -235,37 +235,63 @@ CHAT_HTML = r"""<!doctype html>
         }
       });
 
-      // Presence: I am online
+      // Presence: one write per connection, cleared server-side by onDisconnect.
+      // While the tab is visible a heartbeat refreshes lastActive; tab switches don't write.
+      const HEARTBEAT_MS = 60000;
+      const SERVER_TS = firebase.database.ServerValue.TIMESTAMP;
       const myPresenceRef = presRef.child(myId || 'anon');
-      function setOnline(state){
-        myPresenceRef.update({ online: !!state, lastActive: Date.now(), name: myName }).catch(()=>{});
-      }
-      setOnline(true);
-      window.addEventListener('beforeunload', ()=> setOnline(false));
-      document.addEventListener('visibilitychange', ()=> setOnline(document.visibilityState==='visible'));
+      db.ref('.info/connected').on('value', s=>{
+        if (s.val() !== true) return;
+        myPresenceRef.onDisconnect().update({ online: false, lastActive: SERVER_TS })
+          .then(()=> myPresenceRef.set({ online: true, lastActive: SERVER_TS, name: myName }))
+          .catch(()=>{});
+      });
+      setInterval(()=>{
+        if (document.visibilityState==='visible') {
+          myPresenceRef.child('lastActive').set(SERVER_TS).catch(()=>{});
+        }
+      }, HEARTBEAT_MS);
 
-      // Presence: watch peer
+      // Presence: watch peer (re-rendered locally so "last seen" ages without reads)
       const peerPresenceRef = presRef.child(peerId || 'peer');
-      peerPresenceRef.on('value', s=>{
-        const v = s.val() || {};
-        if (v.online) {
+      let peerPresence = {};
+      function renderPeerStatus(){
+        const v = peerPresence;
+        const idleMs = v.lastActive ? Date.now() - v.lastActive : Infinity;
+        if (v.online && idleMs < 2 * HEARTBEAT_MS) {
           statusEl.textContent = 'Online';
         } else if (v.lastActive) {
-          const mins = Math.max(1, Math.round((Date.now()-v.lastActive)/60000));
+          const mins = Math.max(1, Math.round(idleMs/60000));
           statusEl.textContent = 'Last seen ' + mins + 'm ago';
         } else {
           statusEl.textContent = 'Offline';
         }
-      });
+      }
+      peerPresenceRef.on('value', s=>{ peerPresence = s.val() || {}; renderPeerStatus(); });
+      setInterval(renderPeerStatus, 30000);
 
-      // Read receipts: when I see messages, update my lastReadAt
+      // Read receipts: my lastReadAt = time of the newest peer message I have seen.
+      // Only written when it moves forward, at most once per READ_THROTTLE_MS.
+      const READ_THROTTLE_MS = 5000;
       const myReadRef = readRef.child(myId || 'anon');
+      let newestPeerTs = 0;   // newest peer message rendered
+      let sentReadTs = 0;     // last value written
+      let lastReadWriteAt = 0;
+      let readTimer = null;
       function markRead(){
-        myReadRef.set(Date.now()).catch(()=>{});
+        if (newestPeerTs <= sentReadTs || readTimer) return;
+        const wait = Math.max(0, lastReadWriteAt + READ_THROTTLE_MS - Date.now());
+        readTimer = setTimeout(()=>{
+          readTimer = null;
+          if (newestPeerTs <= sentReadTs) return;
+          sentReadTs = newestPeerTs;
+          lastReadWriteAt = Date.now();
+          myReadRef.set(sentReadTs).catch(()=>{});
+        }, wait);
       }
       // mark as read when at bottom or window visible
-      chatEl.addEventListener('scroll', ()=> { if(atBottom()) markRead(); });
-      document.addEventListener('visibilitychange', ()=> { if(document.visibilityState==='visible') markRead(); });
+      chatEl.addEventListener('scroll', ()=> { if(atBottom()) markRead(); }, { passive: true });
+      document.addEventListener('visibilitychange', ()=> { if(document.visibilityState==='visible' && atBottom()) markRead(); });
 
       // Cache peer's lastReadAt to show "Seen"
       let peerLastReadAt = 0;
@@ -377,8 +403,9 @@ CHAT_HTML = r"""<!doctype html>
         renderMsg(snap.key, m);
         if (atBottom()) scrollToBottom();
         // If it's a peer message and window is visible, mark read
-        if ((m.senderId !== myId) && document.visibilityState==='visible') {
-          markRead();
+        if (m.senderId !== myId) {
+          newestPeerTs = Math.max(newestPeerTs, m.time || 0);
+          if (document.visibilityState==='visible') markRead();
         }
       });
 